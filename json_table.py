@@ -30,8 +30,13 @@ __date__ = '2015-02-27'
 import csv
 import simplejson
 from collections import OrderedDict
+from itertools import islice
 import os
+from multiprocessing.pool import ThreadPool
 import simple_xls
+from sqlite_store import SqliteStore
+
+_pool = None
 
 
 class JsonTable(object):
@@ -52,6 +57,7 @@ class JsonTable(object):
         self.json_path = OrderedDict()
         self.col_map = col_map or OrderedDict()
         self._list_label = OrderedDict()
+        self.csv_data = []
 
         self.json_data = self.load_json_data(json_data)
         self.csv_data = self.load_csv_data(csv_data or [])
@@ -106,22 +112,25 @@ class JsonTable(object):
 
         raise NotImplemented
 
-    def load_csv_file(self, filename, path_deliminator=None, csv_deliminator=None, transpose=None):
+    def load_csv_file(self, filename, path_deliminator=None, csv_deliminator=None, transpose=None, col_map=None):
         """
         :param filename:
         :param csv_deliminator:
+        :param col_map: dict of the column names in the file to the json paths
         :return:
         """
         self.csv_deliminator = csv_deliminator or self.csv_deliminator
 
-        self.csv_data = simple_xls.read_csv(filename, transpose=transpose)
-        assert None not in [h for h in self.csv_data]
+        csv_data = simple_xls.read_csv(filename, transpose=transpose)
+        assert None not in [h for h in csv_data]
+        if col_map:
+            csv_data[0] = [col_map.get(col, col) for col in csv_data[0]]
 
         # with open(filename, 'r') as fn:
         # self.csv_data = [row for row in
         # csv.reader(fn, delimiter=self.csv_deliminator, quoting=csv.QUOTE_MINIMAL)]
-        print 'Load CSV File ' + filename + '\n' + self.str_list_of_list(self.csv_data), '\n'
-        self.load_csv_data(self.csv_data, path_deliminator=path_deliminator, csv_deliminator=csv_deliminator)
+        print 'Load CSV File ' + filename + '\n' + self.str_list_of_list(csv_data), '\n'
+        self.load_csv_data(csv_data, path_deliminator=path_deliminator, csv_deliminator=csv_deliminator)
 
     def load_csv_data(self, csv_data, path_deliminator=None, csv_deliminator=None):
         """
@@ -133,7 +142,10 @@ class JsonTable(object):
         self.csv_deliminator = csv_deliminator or self.csv_deliminator
         self.path_deliminator = path_deliminator or self.path_deliminator
         assert (self.csv_deliminator != self.path_deliminator)
-        self.csv_data = csv_data
+        if isinstance(self.csv_data, SqliteStore) and csv_data is not self.csv_data:
+            self.csv_data.load(csv_data)
+        else:
+            self.csv_data = csv_data
         if csv_data:
             self.json_data = self.unflatten_csv(self.csv_data)
         return self.csv_data
@@ -146,8 +158,8 @@ class JsonTable(object):
         :return: dict of the col_map
         """
         self.csv_deliminator = csv_deliminator or self.csv_deliminator
-        with open(filename, 'r') as fn:
-            col_map = csv.reader(fn, delimiter=csv_deliminator)
+        with simple_xls.open_file(filename, 'r') as fn:
+            col_map = [row for row in csv.reader(fn, delimiter=self.csv_deliminator)]
         return OrderedDict(col_map)
 
     def load_json_file(self, filename, path_deliminator=None, csv_deliminator=None):
@@ -156,7 +168,7 @@ class JsonTable(object):
         :param filename: str of the name of the file
         :return: csv_data
         """
-        with open(filename, 'r') as fn:
+        with simple_xls.open_file(filename, 'r') as fn:
             self.json_data = simplejson.load(fn, object_pairs_hook=OrderedDict)
         self.load_json_data(self.json_data, path_deliminator=path_deliminator, csv_deliminator=csv_deliminator)
 
@@ -175,32 +187,118 @@ class JsonTable(object):
             # print 'json before = ',json_data
             self.json_data = self.normalize_data(self.json_data)
             # print 'json after = ',json_data
-            self.csv_data = self.flatten_json(self.json_data, self.path_deliminator)
+            if isinstance(self.csv_data, SqliteStore):
+                self._flatten_to_store(self.json_data, self.csv_data)
+            else:
+                self.csv_data = self.flatten_json(self.json_data, self.path_deliminator)
         return self.json_data
 
+    def use_sqlite_store(self, filename=':memory:', batch_size=1000):
+        """
+        This will move csv_data into a SqliteStore so a table that doesn't fit in memory can spill to disk.
+        Afterwards csv_data is the store, later loads flatten into it in batches, and get_value_set,
+        get_filtered_data, get_column and merge_csv run as sql with indexes created as they are needed.
+        :param filename: str of the sqlite database file, ':memory:' will keep it in memory
+        :param batch_size: int of the number of rows to insert per transaction
+        :return: SqliteStore
+        """
+        store = SqliteStore(filename, batch_size=batch_size)
+        if self.csv_data:
+            store.load(self.csv_data)
+        self.csv_data = store
+        return store
+
     def save_csv_file(self, filename, keys=None, col_map=None, csv_data=None, csv_deliminator=None, transpose=None,
-                      space_column=None):
+                      space_column=None, compresslevel=None):
         """
         :param filename:
         :param csv_data:
         :param csv_deliminator:
+        :param compresslevel: int of the compression level, if filename ends in .gz, .bz2, .xz or .lzma
         :return:
         """
         csv_deliminator = csv_deliminator or self.csv_deliminator
         keys = keys or col_map
         csv_data = csv_data or self.get_value_set(keys=keys, col_map=col_map)
         # print 'Saving CSV file', '\n', self.str_list_of_list(csv_data), '\n'
-        simple_xls.write_csv(filename, csv_data, transpose=transpose, space_column=space_column)
+        simple_xls.write_csv(filename, csv_data, transpose=transpose, space_column=space_column,
+                             compresslevel=compresslevel)
 
-    def save_json_file(self, filename, json_data=None, indent=2):
+    def save_json_file(self, filename, json_data=None, indent=2, json_lines=False, csv_data=None, compresslevel=None):
         """
+        This will encode the json a chunk at a time straight to the file, so the text is never held in memory
         :param filename:
-        :param json_data:
+        :param json_data: obj to save, a list can also be given as an iterator of its elements
+        :param indent: int of the indent, None will write compact json
+        :param json_lines: bool if True a list will be written as one compact element per line (JSON Lines)
+        :param csv_data: list of list to unflatten one root element at a time while writing, instead of json_data
+        :param compresslevel: int of the compression level, if filename ends in .gz, .bz2, .xz or .lzma
         :return:
         """
+        if csv_data:
+            json_data = self.iter_unflatten_csv(csv_data)
+            if not csv_data[0][0].startswith(self._list_postfix):
+                json_data = json_data.next()
         json_data = json_data or self.json_data
-        with open(filename, 'w') as fn:
-            fn.write(simplejson.dumps(json_data, indent=indent))
+        with simple_xls.open_file(filename, 'w', compresslevel=compresslevel) as fn:
+            if json_lines:
+                encoder = simplejson.JSONEncoder(separators=(',', ':'), iterable_as_array=True)
+                for value in isinstance(json_data, dict) and [json_data] or json_data:
+                    fn.write(encoder.encode(value) + '\n')
+            else:
+                separators = (',', ':') if indent is None else None
+                encoder = simplejson.JSONEncoder(indent=indent, separators=separators, iterable_as_array=True)
+                for chunk in encoder.iterencode(json_data):
+                    fn.write(chunk)
+
+    def load_json_file_async(self, filename, path_deliminator=None, csv_deliminator=None, pool=None, callback=None):
+        """
+        This will run load_json_file on a worker of the pool so the caller isn't blocked
+        :param filename: str of the name of the file
+        :param pool: obj with apply_async (i.e. ThreadPool) to do the work, defaults to get_pool()
+        :param callback: func to call with the result when it is done
+        :return: AsyncResult of load_json_file
+        """
+        pool = pool or get_pool()
+        return pool.apply_async(self.load_json_file, (filename, path_deliminator, csv_deliminator), callback=callback)
+
+    def load_csv_file_async(self, filename, path_deliminator=None, csv_deliminator=None, transpose=None, pool=None,
+                            callback=None):
+        """
+        This will run load_csv_file on a worker of the pool so the caller isn't blocked
+        :param filename: str of the name of the file
+        :param pool: obj with apply_async (i.e. ThreadPool) to do the work, defaults to get_pool()
+        :param callback: func to call with the result when it is done
+        :return: AsyncResult of load_csv_file
+        """
+        pool = pool or get_pool()
+        return pool.apply_async(self.load_csv_file, (filename, path_deliminator, csv_deliminator, transpose),
+                                callback=callback)
+
+    def save_csv_file_async(self, filename, keys=None, col_map=None, csv_data=None, csv_deliminator=None,
+                            transpose=None, space_column=None, pool=None, callback=None):
+        """
+        This will run save_csv_file on a worker of the pool so the caller isn't blocked
+        :param filename: str of the name of the file
+        :param pool: obj with apply_async (i.e. ThreadPool) to do the work, defaults to get_pool()
+        :param callback: func to call with the result when it is done
+        :return: AsyncResult of save_csv_file
+        """
+        pool = pool or get_pool()
+        return pool.apply_async(self.save_csv_file,
+                                (filename, keys, col_map, csv_data, csv_deliminator, transpose, space_column),
+                                callback=callback)
+
+    def save_json_file_async(self, filename, json_data=None, indent=2, pool=None, callback=None):
+        """
+        This will run save_json_file on a worker of the pool so the caller isn't blocked
+        :param filename: str of the name of the file
+        :param pool: obj with apply_async (i.e. ThreadPool) to do the work, defaults to get_pool()
+        :param callback: func to call with the result when it is done
+        :return: AsyncResult of save_json_file
+        """
+        pool = pool or get_pool()
+        return pool.apply_async(self.save_json_file, (filename, json_data, indent), callback=callback)
 
     def unflatten_csv(self, data, path_deliminator=None):
         """
@@ -225,6 +323,49 @@ class JsonTable(object):
         ret = self.normalize_data(ret)
         return ret
 
+    def iter_unflatten_csv(self, data=None, path_deliminator=None):
+        """
+        This will unflatten csv_data whose root is a list one element at a time, so the whole json_data
+        never has to be built.  Any other csv_data is yielded as a single unflattened object.
+        :param data: list of list of the csv_data, defaults to self.csv_data
+        :param path_deliminator:
+        :return: generator of the normalized root elements
+        """
+        data = data or self.csv_data
+        header = data[0]
+        if not header[0].startswith(self._list_postfix):
+            yield self.unflatten_csv(data, path_deliminator)
+            return
+
+        self.path_deliminator = path_deliminator or self.path_deliminator
+        ret = []
+        row = 1
+        key_value = data[row][0]
+        while row < len(data) and data[row][0] == key_value:
+            rows_processed, col = self._unflatten_list_row(header, data, ret, row, 0, '.', 1)
+            row += rows_processed or 1
+            # only the last value can still be changed by the next row
+            done = ret[:-1]
+            del ret[:-1]
+            for value in self._normalize_values(done):
+                yield value
+        assert row == len(data)
+        for value in self._normalize_values(ret):
+            yield value
+
+    def _normalize_values(self, values):
+        """
+        :param values: list of values of a list
+        :return: list of the values that are not None or empty after they are normalized
+        """
+        ret = []
+        for value in values:
+            if value is not None:
+                self._normalize_data(value)
+                if value != [] and value != {}:
+                    ret.append(value)
+        return ret
+
     def _unflatten_dict(self, header, data, row, col, path, level):
         """
         :param header:
@@ -299,32 +440,7 @@ class JsonTable(object):
             return None, 1, _col+1
 
         while _row < len(data) and data[_row][col] == key_value:
-            _col = col + 1
-            rows_processed = 1
-            while _col < len(header):
-                key, sub_path, remaining_path = self._get_key_path(header[_col], path, level)
-                if key == None:  # we are done with this embedded object
-                    rows_processed = self._get_rows_processed_later(header,data,_row,_col)
-                    print 'rows_processed_later',rows_processed,_row,_col
-                    _col -= 1
-                    break
-
-                elif key.endswith(self._list_postfix):
-                    value, rows_processed, _col = self._unflatten_list(header, data, _row, _col, sub_path, level + 1)
-                    print 'value',value,'col',_col,'_row_processed',rows_processed
-                    self._add_value_to_list(ret, value)
-
-                elif remaining_path:
-                    value, rows_processed, _col = self._unflatten_dict(header, data, _row, _col, sub_path, level + 1)
-                    print 'rows_processed',rows_processed
-                    self._add_value_to_list(ret, value)
-
-                else:
-                    ret.append(data[_row][_col])
-
-                if _col == len(header): break
-                _col += 1
-            print 'level',level,'_row = ',_row,'rows_processed = ',rows_processed,'total = ',_row+rows_processed
+            rows_processed, _col = self._unflatten_list_row(header, data, ret, _row, col, path, level)
             _row += rows_processed or 1
             assert _row <= len(data)
 
@@ -334,6 +450,46 @@ class JsonTable(object):
         print 'Done with Unflatten_List (%s,%s) -> (%s,%s) at level %s at path %s'%(row,col,_row-1,_col,level,path)
         return ret, _row - row, _col
 
+    def _unflatten_list_row(self, header, data, ret, _row, col, path, level):
+        """
+        This will unflatten the list item(s) starting at _row and add them to ret
+        :param header:
+        :param data:
+        :param ret: list to add the values to
+        :param _row: int of the row to start at
+        :param col: int of the column of the list label
+        :param path:
+        :param level:
+        :return: tuple of (int of rows_processed, int of _col)
+        """
+        _col = col + 1
+        rows_processed = 1
+        while _col < len(header):
+            key, sub_path, remaining_path = self._get_key_path(header[_col], path, level)
+            if key == None:  # we are done with this embedded object
+                rows_processed = self._get_rows_processed_later(header,data,_row,_col)
+                print 'rows_processed_later',rows_processed,_row,_col
+                _col -= 1
+                break
+
+            elif key.endswith(self._list_postfix):
+                value, rows_processed, _col = self._unflatten_list(header, data, _row, _col, sub_path, level + 1)
+                print 'value',value,'col',_col,'_row_processed',rows_processed
+                self._add_value_to_list(ret, value)
+
+            elif remaining_path:
+                value, rows_processed, _col = self._unflatten_dict(header, data, _row, _col, sub_path, level + 1)
+                print 'rows_processed',rows_processed
+                self._add_value_to_list(ret, value)
+
+            else:
+                ret.append(data[_row][_col])
+
+            if _col == len(header): break
+            _col += 1
+        print 'level',level,'_row = ',_row,'rows_processed = ',rows_processed,'total = ',_row+rows_processed
+        return rows_processed, _col
+
     def _get_rows_processed_later(self,header,data,row,col):
         """
             This hierarchy has stopped, but dictionary needs to return
@@ -354,7 +510,7 @@ class JsonTable(object):
         return 1
 
     def _add_value_to_list(self, ret, value):
-        value = self.normalize_data(value)
+        self._normalize_data(value)
         if not value: return
         # print ret
         if ret == []:
@@ -458,25 +614,65 @@ class JsonTable(object):
             # print 'data',_data
             # print '_col', _col
             # print 'cols', cols
-            if cols[1:] == _col and len(data) == 1:
-                data.append([list_label] + _data[0])
-                # print 'data1',data[-1]
-            else:
-                cols += [c for c in _col if c not in cols]
+            new_cols, new_data = self._flatten_list_item(cols, len(data), list_label, _col, _data)
+            if new_cols:
                 for row in data:  # noinspection PyUnusedLocal
                     row += [None] * (len(cols) - len(row))
+            data += new_data
+        return cols, data
 
-                # self.increment_lists(_col,_data,1) # i #
+    def _flatten_list_item(self, cols, row_count, list_label, _col, _data):
+        """
+        This will line up the flattened rows of one list item with the columns of the list
+        :param cols: list of the columns of the list so far, new columns will be added to it
+        :param row_count: int of the number of rows of the list so far
+        :param list_label: str of the label of the list
+        :param _col: list of the columns of the item
+        :param _data: list of list of the rows of the item
+        :return: tuple of (list of the new columns, list of list of the new rows)
+        """
+        if cols[1:] == _col and row_count == 1:
+            return [], [[list_label] + _data[0]]
 
-                for row in _data:
-                    new_row = [list_label]
-                    for c in cols[1:]:
-                        if c in _col:
-                            new_row.append(row[_col.index(c)])
-                        else:
-                            new_row.append(None)
-                    data.append(new_row)
-        return cols, data
+        new_cols = [c for c in _col if c not in cols]
+        cols += new_cols
+
+        # self.increment_lists(_col,_data,1) # i #
+
+        new_data = []
+        for row in _data:
+            new_row = [list_label]
+            for c in cols[1:]:
+                if c in _col:
+                    new_row.append(row[_col.index(c)])
+                else:
+                    new_row.append(None)
+            new_data.append(new_row)
+        return new_cols, new_data
+
+    def _flatten_to_store(self, obj, store):
+        """
+        This will flatten obj into the store.  If obj is a list it is flattened an item
+        at a time, so the rows are inserted in batches without all of csv_data being in memory.
+        :param obj:
+        :param store: SqliteStore
+        :return: None
+        """
+        if not isinstance(obj, list):
+            header, data = self._flatten(obj=obj, level=0, path='')
+            store.load([header] + data)
+            return
+
+        list_label = self._get_list_label('')
+        cols = [self._list_postfix]
+        store.create(cols)
+        for item in obj:
+            _col, _data = self._flatten(item, 1, self.path_deliminator)
+            new_cols, new_data = self._flatten_list_item(cols, len(store) - 1, list_label, _col, _data)
+            if new_cols:
+                store.add_columns(new_cols)
+            store.insert_rows(new_data)
+        store.flush()
 
     def increment_lists(self, col, data, index):
         """ Lists from later keys will be repeated,
@@ -518,76 +714,206 @@ class JsonTable(object):
         self._list_label[path] += 1
         return '%s%s_%s_0' % (self._list_head, self._list_label.keys().index(path), self._list_label[path])
 
+    def append_json(self, records):
+        """
+        This will add records to the end of a table whose root is a list.  Only the new records are
+        flattened, against the existing header, which is only extended for new paths.  The list labels
+        continue from the ones in the table and json_data is extended in place.
+        :param records: list of the json records to add
+        :return: None
+        """
+        records = self._normalize_values(records)
+        if not records:
+            return
+        if not self.csv_data:
+            self.load_json_data(records)
+            return
+
+        header = self.csv_data[0]
+        assert header[0] == self._list_postfix, 'records can only be appended to a table whose root is a list'
+        self._sync_list_labels()
+        root_label = self.csv_data[1][0] if len(self.csv_data) > 1 else self._get_list_label('')
+        cols = list(header)
+        row_count = len(self.csv_data) - 1
+        rows = []
+        for record in records:
+            _col, _data = self._flatten(record, 1, self.path_deliminator)
+            new_cols, new_data = self._flatten_list_item(cols, row_count + len(rows), root_label, _col, _data)
+            rows += new_data
+        self._add_rows(cols[len(header):], rows)
+        self.json_data.extend(records)
+
+    def append_rows(self, rows, header=None):
+        """
+        This will add flattened rows to the end of a table whose root is a list.  The header is only
+        extended for new columns, the list labels of the rows are renumbered to continue the ones in the
+        table, and only the new rows are unflattened to extend json_data in place.
+        :param rows: list of list of the rows to add
+        :param header: list of str of the columns of rows, defaults to the header of the table
+        :return: None
+        """
+        if not rows:
+            return
+        if not self.csv_data:
+            self.load_csv_data([list(header)] + [list(row) for row in rows])
+            return
+
+        table_header = self.csv_data[0]
+        assert table_header[0] == self._list_postfix, 'rows can only be appended to a table whose root is a list'
+        header = header or table_header
+        new_cols = [col for col in header if col not in table_header]
+        cols = list(table_header) + new_cols
+        indexes = [cols.index(col) for col in header]
+        self._sync_list_labels()
+        root_label = self.csv_data[1][0] if len(self.csv_data) > 1 else self._get_list_label('')
+
+        labels = {}
+        new_rows = []
+        for row in rows:
+            new_row = [None] * len(cols)
+            for i, value in zip(indexes, row):
+                if value is not None and i and cols[i].endswith(self._list_postfix):
+                    if (i, value) not in labels:
+                        labels[(i, value)] = self._get_list_label(cols[i][:-len(self._list_postfix)])
+                    value = labels[(i, value)]
+                new_row[i] = value
+            new_row[0] = root_label
+            new_rows.append(new_row)
+
+        self._add_rows(new_cols, new_rows)
+        self.json_data.extend(self.iter_unflatten_csv([cols] + new_rows))
+
+    def _add_rows(self, new_cols, rows):
+        """
+        This will add columns and rows to the end of csv_data
+        :param new_cols: list of str of the new columns
+        :param rows: list of list of the new rows, in the order of the header plus new_cols
+        :return: None
+        """
+        if isinstance(self.csv_data, SqliteStore):
+            if new_cols:
+                self.csv_data.add_columns(new_cols)
+            self.csv_data.insert_rows(rows)
+            self.csv_data.flush()
+            return
+
+        header = self.csv_data[0]
+        header += new_cols
+        if new_cols:
+            for row in self.csv_data[1:]:  # noinspection PyUnusedLocal
+                row += [None] * (len(header) - len(row))
+        for row in rows:
+            row += [None] * (len(header) - len(row))
+        self.csv_data += rows
+
+    def _sync_list_labels(self):
+        """
+        unflatten_csv clears the list labels, so this will rebuild them from the list
+        columns of csv_data, so new labels don't repeat the ones in the table
+        :return: None
+        """
+        if self._list_label:
+            return
+        list_cols = [(i, col[:-len(self._list_postfix)]) for i, col in enumerate(self.csv_data[0])
+                     if col.endswith(self._list_postfix)]
+        counts = {}
+        for row in islice(self.csv_data, 1, None):
+            for i, path in list_cols:
+                try:
+                    index, count = [int(part) for part in row[i][len(self._list_head):].split('_')[:2]]
+                except (AttributeError, TypeError, ValueError):
+                    continue
+                counts[index] = (path, max(count, counts.get(index, (path, 0))[1]))
+        for index in range(max(counts.keys() + [-1]) + 1):
+            path, count = counts.get(index, ((None, index), -1))  # keep the index of paths that are gone
+            self._list_label[path] = count
+
     def merge_csv(self, new_csv_data, col_ids=None, col_map=None):
         """
         This will add the keys based on common ids in col_ids
         If the same column is in both the new and old data then the column
         will be added with the '_' prefix, unless the data is the same
         :param new_csv_data:
-        :param col_ids: dict of new_csv col ids to old_csv col ids
+        :param col_ids: dict of new_csv col ids to old_csv col ids, these are not added with the '_' prefix
         :param col_map:
         :return:
         """
         col_map = col_map or self.col_map
-        old_csv_data = self.csv_data
+        col_ids = col_ids or {}
         new_header = new_csv_data[0]
-        old_header = old_csv_data[0]
+        old_header = list(self.csv_data[0])
 
+        new_columns = []
+        old_cols = {}  # new column to the old column it is merged into
         for col in new_header:
             old_col = col_map.get(col, col)
+            if col in col_ids:  # the ids are the same data so they share the column
+                old_col = col_ids[col]
+            elif old_col in old_header:
+                old_col = '_' + old_col
+                col_map[col] = old_col
             if old_col not in old_header:
+                new_columns.append(old_col)
                 old_header.append(old_col)
-            else:
-                old_header.append('_' + old_col)
-                col_map[col] = '_' + old_col
-
-        for row in old_csv_data[1:]:  # noinspection PyUnusedLocal
+            old_cols[col] = old_col
+
+        # new records join the lists that hold the ids, so they get the list labels of the last row
+        id_keys = list(col_ids)
+        labels = OrderedDict()
+        for i, col in enumerate(self.csv_data[0]):
+            path = col[:-len(self._list_postfix)] + self.path_deliminator
+            if col.endswith(self._list_postfix) and [k for k in id_keys if col_ids[k].startswith(path)]:
+                labels[col] = len(self.csv_data) > 1 and self.csv_data[-1][i] or None
+        transfer = [(new_header.index(k), old_cols[k]) for k in new_header if old_cols[k] not in labels]
+
+        new_id_indexes = [new_header.index(k) for k in id_keys]
+        groups = OrderedDict()  # new rows grouped by their ids, in order
+        for new_row in new_csv_data[1:]:
+            groups.setdefault(tuple([new_row[i] for i in new_id_indexes]), []).append(new_row)
+
+        if isinstance(self.csv_data, SqliteStore):
+            self.csv_data.add_columns(new_columns)
+            self.csv_data.merge([col_ids[k] for k in id_keys], groups, transfer, labels)
+            self.json_data = self.unflatten_csv(self.csv_data, self.path_deliminator)
+            return
+
+        old_id_indexes = [old_header.index(col_ids[k]) for k in id_keys]
+        transfer_indexes = [(new_i, old_header.index(old_col)) for new_i, old_col in transfer]
+        data = self.csv_data[1:]
+        old_index = {}
+        for i, row in enumerate(data):  # noinspection PyUnusedLocal
             row += [None] * (len(old_header) - len(row))
-
-        filter_indexes = dict([(k, new_header.index(k)) for k in col_ids])
-        transfer_indexes = dict([(new_header.index(k), old_header.index(col_map.get(k, k))) for k in new_header])
-        while len(new_csv_data) > 1:  # data other than header
-            new_row = new_csv_data[-1]
-
-            new_filter = OrderedDict([(col_ids[k], new_row[filter_indexes[k]]) for k in col_ids])
-            old_filter = OrderedDict([(k, new_row[filter_indexes[k]]) for k in col_ids])
-
-            old_filtered_data = self.get_filtered_data(data_filter=old_filter, header=old_header, data=self.csv_data)
-            new_filtered_data = self.get_filtered_data(data_filter=new_filter, header=new_header, data=new_csv_data)
-
-            if not old_filtered_data:
-                for new_row in new_filtered_data:
-                    row = [None] * (len(new_header) - len(new_row)) + new_row
-                    for k in new_filter:
-                        row[old_header.index(k)] = new_filter[k]
-                    old_csv_data.append(row)
-
-            elif len(new_filtered_data) == 1:  # then it can work in place for speed
-                for old_row in old_filtered_data:
-                    for old_i, new_i in transfer_indexes.items():
-                        old_row[old_i] = new_row[new_i]
-
-            else:
-                for old_row in old_filtered_data:
-                    old_csv_data.remove(old_row)
-                    for new_row in new_filtered_data:
-                        copied_row = old_row.copy()
-                        for old_i, new_i in transfer_indexes.items():
+            old_index.setdefault(tuple([row[j] for j in old_id_indexes]), []).append(i)
+
+        for key, new_rows in groups.items():
+            old_rows = old_index.get(key)
+            if not old_rows:
+                for new_row in new_rows:
+                    row = [labels.get(col) for col in old_header]
+                    for old_i, value in zip(old_id_indexes, key):
+                        row[old_i] = value
+                    for new_i, old_i in transfer_indexes:
+                        row[old_i] = new_row[new_i]
+                    data.append(row)
+
+            else:  # the first new row is merged in place and copies are added for the rest
+                for i in old_rows:
+                    for new_row in new_rows[1:]:
+                        copied_row = list(data[i])
+                        for new_i, old_i in transfer_indexes:
                             copied_row[old_i] = new_row[new_i]
-                        old_csv_data.append(copied_row)
-
-            for new_row in new_filtered_data:
-                new_csv_data.remove(new_row)
+                        data.append(copied_row)
+                    for new_i, old_i in transfer_indexes:
+                        data[i][old_i] = new_rows[0][new_i]
 
-        data = new_csv_data[1:]
         data.sort()
         self.csv_data = [old_header] + data
         self.json_data = self.unflatten_csv(self.csv_data, self.path_deliminator)
 
     def merge_data(self, new_json_data, col_ids=None, path_deliminator=None):
-        path_deliminator = path_deliminator or self.path_deliminator
-        new_csv_data = self.flatten_json(new_json_data, path_deliminator=path_deliminator)
-        self.merge_csv(new_csv_data, col_ids=col_ids)
+        self.path_deliminator = path_deliminator or self.path_deliminator
+        header, data = self._flatten(obj=new_json_data, level=0, path='')
+        self.merge_csv([header] + data, col_ids=col_ids)
 
     def get_column(self, column_name):
         """
@@ -595,6 +921,8 @@ class JsonTable(object):
         :param column_name: str of the column name / path
         :return: list of values
         """
+        if isinstance(self.csv_data, SqliteStore):
+            return self.csv_data.get_column(column_name)
         index = self.csv_data[0].index(column_name)
         return [row[index] for row in self.csv_data[1:]]
 
@@ -683,16 +1011,24 @@ class JsonTable(object):
         keys = keys or col_map.keys() or csv_data[0]
         ret = [keys]
         header = csv_data[0]
+        if isinstance(csv_data, SqliteStore):
+            data_filter = data_filter and dict([(col_map.get(k, k), v) for k, v in data_filter.items()])
+            return ret + csv_data.get_value_set([col_map.get(k, k) for k in keys], data_filter, only_unique)
         indexes = [header.index(col_map.get(k, k)) for k in keys]
 
         filtered_data = self.get_filtered_data(data_filter=data_filter, header=header, data=csv_data[1:],
                                                col_map=col_map)
+        unique = set()
         for row in filtered_data:
             # print 'row = ',row
             # print 'indexes = ',indexes
             reduced_row = [row[i] for i in indexes]
-            if only_unique == False or (reduced_row != ret[-1:] or reduced_row not in ret[1:-1]):
-                ret.append(reduced_row)
+            if only_unique:
+                unique_key = tuple([(type(value), value) for value in reduced_row])  # so True and 1 differ
+                if unique_key in unique:
+                    continue
+                unique.add(unique_key)
+            ret.append(reduced_row)
         return ret
 
     def get_filtered_data(self, data_filter=None, header=None, data=None, col_map=None):
@@ -703,10 +1039,13 @@ class JsonTable(object):
         :param col_map:
         :return: list of list
         """
+        col_map = col_map or self.col_map
+        if data is None and isinstance(self.csv_data, SqliteStore):
+            return self.csv_data.get_filtered_data(
+                data_filter and dict([(col_map.get(k, k), v) for k, v in data_filter.items()]))
         data = data or self.csv_data[1:]
         if data_filter is None: return data
         header = header or self.csv_data[0]
-        col_map = col_map or self.col_map
         ret = []
         data_filter_index = dict([(header.index(col_map.get(k, k)), v) for k, v in data_filter.items()])
         for row in data:
@@ -776,6 +1115,74 @@ class SubTemplate(object):
         self.text = text
 
 
+def get_pool(processes=None):
+    """
+    This will return the thread pool shared by the JsonTable *_async methods
+    :param processes: int of the number of threads, only used when the pool is first created
+    :return: ThreadPool
+    """
+    global _pool
+    if _pool is None:
+        _pool = ThreadPool(processes)
+    return _pool
+
+
+def convert_file(filename, new_filename=None, transpose=False, col_map=None):
+    """
+    This will convert a json file to a csv file or a csv file to a json file
+    :param filename: str of the file to convert, which can be compressed i.e. data.json.gz
+    :param new_filename: str of the file to create, defaults to filename with the other extension
+    :param transpose: bool if True the csv file will be transposed
+    :param col_map: dict of the csv column names to the json paths
+    :return: int of the number of csv rows converted
+    """
+    name, compression_ext = simple_xls.split_compression_ext(filename)
+    name, ext = os.path.splitext(name)
+    new_filename = new_filename or name + {'.csv': '.json', '.json': '.csv'}[ext] + compression_ext
+    table = JsonTable()
+    if ext == '.csv':
+        csv_data = simple_xls.read_csv(filename, transpose=transpose)
+        if col_map:
+            csv_data[0] = [col_map.get(col, col) for col in csv_data[0]]
+        table.save_json_file(new_filename, csv_data=csv_data)
+        return len(csv_data) - 1
+    else:
+        table.load_json_file(filename)
+        table.save_csv_file(new_filename, col_map=col_map, transpose=transpose)
+    return len(table.csv_data) - 1
+
+
+def convert_many(filenames, concurrency=4, pool=None, transpose=False, new_filenames=None, col_map=None):
+    """
+    This will convert many files with at most concurrency files in progress at once.
+    An exception for one file is returned in its result instead of stopping the others.
+    :param filenames: list of str of the files to convert
+    :param concurrency: int of the number of files to convert at once, when pool isn't given
+    :param pool: obj with imap (i.e. ThreadPool or multiprocessing.Pool) to do the conversions on
+    :param transpose: bool if True the csv files will be transposed
+    :param new_filenames: list of str of the files to create, defaults to each filename with the other extension
+    :param col_map: dict of the csv column names to the json paths
+    :return: list of tuple of (filename, int of rows converted, exception or None) in the order of filenames
+    """
+    new_filenames = new_filenames or [None] * len(filenames)
+    own_pool = pool is None
+    pool = pool or ThreadPool(concurrency)
+    try:
+        return list(pool.imap(_convert_file, [(filenames[i], new_filenames[i], transpose, col_map)
+                                              for i in range(len(filenames))]))
+    finally:
+        if own_pool:
+            pool.close()
+
+
+def _convert_file(args):
+    filename, new_filename, transpose, col_map = args
+    try:
+        return filename, convert_file(filename, new_filename, transpose=transpose, col_map=col_map), None
+    except Exception as e:
+        return filename, None, e
+
+
 if __name__ == '__main__':
     import sys, pytest
 
@@ -0,0 +1,165 @@
+""" This is the command line entry point to convert a directory tree of json files to csv files
+    and csv files to json files, using a process pool so every file doesn't start a new interpreter.
+
+    Compressed files (i.e. data.json.gz) are converted to files with the same compression.
+    Outputs that are already up to date with their input (and map file) are skipped, by modification
+    time or, with --hash, by the md5 of the input recorded in a manifest in the output directory.
+
+    Usage:
+        python json_table_convert.py test_examples -o test_examples/answer --transpose --map col_map.csv
+"""
+
+import argparse
+import hashlib
+import multiprocessing
+import os
+import sys
+import time
+
+import simplejson
+
+import simple_xls
+from json_table import JsonTable, convert_many
+
+switch = {'.csv': '.json', '.json': '.csv'}
+MANIFEST = '.json_table_convert.json'
+
+
+def find_files(path, output_path=None, extensions=None):
+    """
+    This will walk the directory tree for files to convert.  A file that is the output of another
+    file is not converted itself, with json files taking precedence, so a.json and a.csv in the
+    same tree don't overwrite each other.
+    :param path: str of the root of the directory tree
+    :param output_path: str of the root of the output tree, defaults to path
+    :param extensions: list of str of the extensions to convert, defaults to .json and .csv
+    :return: list of tuple of (filename, new_filename)
+    """
+    output_path = output_path or path
+    extensions = extensions or ['.json', '.csv']
+    files = []
+    for dir_path, dir_names, file_names in os.walk(path):
+        dir_names[:] = sorted([d for d in dir_names
+                               if os.path.abspath(os.path.join(dir_path, d)) != os.path.abspath(output_path)])
+        for file_name in sorted(file_names):
+            name, compression_ext = simple_xls.split_compression_ext(file_name)
+            name, ext = os.path.splitext(name)
+            if ext in extensions:
+                rel_path = os.path.relpath(os.path.join(dir_path, name), path)
+                files.append((os.path.join(dir_path, file_name),
+                              os.path.join(output_path, rel_path + switch[ext] + compression_ext)))
+
+    ret = []
+    outputs = set()
+    for filename, new_filename in sorted(
+            files, key=lambda f: extensions.index(os.path.splitext(simple_xls.split_compression_ext(f[0])[0])[1])):
+        if os.path.abspath(filename) not in outputs:
+            outputs.add(os.path.abspath(new_filename))
+            ret.append((filename, new_filename))
+    ret.sort()
+    return ret
+
+
+def file_hash(filename):
+    """
+    :param filename: str of the file name
+    :return: str of the md5 hex digest of the file
+    """
+    md5 = hashlib.md5()
+    with open(filename, 'rb') as fn:
+        for block in iter(lambda: fn.read(1 << 20), b''):
+            md5.update(block)
+    return md5.hexdigest()
+
+
+def is_up_to_date(filename, new_filename, map_filename=None, manifest=None):
+    """
+    :param filename: str of the input file
+    :param new_filename: str of the output file
+    :param map_filename: str of the col_map file the output depends on
+    :param manifest: dict of input file to md5, if given the hash is checked instead of the modification time
+    :return: bool if True the output doesn't need to be remade
+    """
+    if not os.path.exists(new_filename):
+        return False
+    if map_filename and os.path.getmtime(map_filename) > os.path.getmtime(new_filename):
+        return False
+    if manifest is not None:
+        return manifest.get(os.path.abspath(filename)) == file_hash(filename)
+    return os.path.getmtime(filename) <= os.path.getmtime(new_filename)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Convert a directory tree of json files to csv and csv to json')
+    parser.add_argument('path', help='directory tree (or single file) to convert')
+    parser.add_argument('-o', '--output', help='directory to write the converted files to, defaults to path')
+    parser.add_argument('-t', '--transpose', action='store_true', help='read and write transposed csv files')
+    parser.add_argument('-m', '--map', help='csv file of column name to json path, see JsonTable.load_map_file')
+    parser.add_argument('-p', '--processes', type=int, default=None, help='number of worker processes')
+    parser.add_argument('--only', choices=['json', 'csv'], help='only convert files of this extension')
+    parser.add_argument('--hash', action='store_true', help='skip outputs by input md5 instead of modification time')
+    parser.add_argument('-f', '--force', action='store_true', help='convert even if the output is up to date')
+    args = parser.parse_args(argv)
+
+    extensions = args.only and ['.' + args.only] or None
+    if os.path.isfile(args.path):
+        name, compression_ext = simple_xls.split_compression_ext(args.path)
+        name, ext = os.path.splitext(name)
+        output = args.output and os.path.join(args.output, os.path.basename(name)) or name
+        files = [(args.path, output + switch[ext] + compression_ext)]
+        output_path = args.output or os.path.dirname(args.path)
+    else:
+        files = find_files(args.path, args.output, extensions)
+        output_path = args.output or args.path
+
+    col_map = args.map and JsonTable().load_map_file(args.map) or None
+
+    manifest_file = os.path.join(output_path, MANIFEST)
+    manifest = None
+    if args.hash:
+        manifest = {}
+        if os.path.exists(manifest_file):
+            with open(manifest_file, 'r') as fn:
+                manifest = simplejson.load(fn)
+
+    todo = [(filename, new_filename) for filename, new_filename in files
+            if args.force or not is_up_to_date(filename, new_filename, args.map, manifest)]
+    for filename, new_filename in todo:
+        if not os.path.exists(os.path.dirname(new_filename) or '.'):
+            os.makedirs(os.path.dirname(new_filename))
+
+    start = time.time()
+    pool = multiprocessing.Pool(args.processes)
+    try:
+        results = convert_many([filename for filename, _ in todo], pool=pool, transpose=args.transpose,
+                               new_filenames=[new_filename for _, new_filename in todo], col_map=col_map)
+    finally:
+        pool.close()
+        pool.join()
+    seconds = max(time.time() - start, 1e-6)
+
+    rows = size = failed = 0
+    for filename, file_rows, error in results:
+        if error is None:
+            rows += file_rows
+            size += os.path.getsize(filename)
+            if manifest is not None:
+                manifest[os.path.abspath(filename)] = file_hash(filename)
+        else:
+            failed += 1
+            sys.stderr.write('Failed to convert %s: %r\n' % (filename, error))
+
+    if manifest is not None:
+        with open(manifest_file, 'w') as fn:
+            simplejson.dump(manifest, fn, indent=2)
+
+    converted = len(results) - failed
+    print 'Converted %s files (%s skipped, %s failed) in %.3f seconds' % (
+        converted, len(files) - len(todo), failed, seconds)
+    print '%.1f files/sec, %.1f rows/sec, %.3f MB/sec' % (
+        converted / seconds, rows / seconds, size / seconds / (1 << 20))
+    return failed and 1 or 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -9,8 +9,11 @@ import pytest
 import glob
 import os
 import sys
-from json_table import JsonTable
+from json_table import JsonTable, convert_many
 import shutil
+import copy
+import simplejson
+import simple_xls
 
 switch = {'.csv': '.json', '.json': '.csv'}
 
@@ -55,6 +58,99 @@ def test_convert_example_file(filename):
             assert (original_text == test_text)
 
 
+@pytest.mark.parametrize("filename", examples)
+def test_stream_json_file(filename, tmpdir):
+    table = JsonTable()
+    table.load_json_file(filename)
+    table.save_json_file(str(tmpdir.join('stream.json')), csv_data=table.csv_data)
+    table.save_json_file(str(tmpdir.join('lines.json')), json_lines=True)
+
+    with open(filename, 'r') as original:
+        assert tmpdir.join('stream.json').read() == original.read()
+    lines = tmpdir.join('lines.json').read().splitlines()
+    if isinstance(table.json_data, list):
+        assert [simplejson.loads(line) for line in lines] == table.json_data
+    else:
+        assert [simplejson.loads(line) for line in lines] == [table.json_data]
+
+
+@pytest.mark.parametrize("filename", examples)
+@pytest.mark.parametrize("compression", ['.gz', '.bz2'])
+def test_compressed_file(filename, compression, tmpdir):
+    csv_file = str(tmpdir.join('table.csv' + compression))
+    json_file = str(tmpdir.join('table.json' + compression))
+
+    table = JsonTable()
+    table.load_json_file(filename)
+    table.save_csv_file(csv_file, compresslevel=1)
+    table2 = JsonTable()
+    table2.load_csv_file(csv_file)
+    table2.save_json_file(json_file)
+
+    assert simple_xls.get_compression(json_file) == simple_xls.COMPRESSION_EXTENSIONS[compression]
+    with open(filename, 'r') as original:
+        with simple_xls.open_file(json_file, 'r') as test:
+            assert original.read() == test.read()
+
+
+@pytest.mark.parametrize("filename", examples)
+def test_sqlite_store(filename, tmpdir):
+    table = JsonTable()
+    table.load_json_file(filename)
+    table.save_csv_file(str(tmpdir.join('memory.csv')))
+
+    table2 = JsonTable()
+    table2.use_sqlite_store(str(tmpdir.join('table.db')), batch_size=2)
+    table2.load_json_file(filename)
+    table2.save_csv_file(str(tmpdir.join('store.csv')))
+    assert tmpdir.join('store.csv').read() == tmpdir.join('memory.csv').read()
+    assert list(table2.csv_data) == table.csv_data
+
+    table2.load_csv_file(str(tmpdir.join('store.csv')))
+    assert table2.json_data == table.json_data
+    for col in table.csv_data[0]:
+        assert table2.get_column(col) == table.get_column(col)
+
+
+@pytest.mark.parametrize("filename", examples)
+def test_append(filename):
+    table = JsonTable()
+    table.load_json_file(filename)
+    if not isinstance(table.json_data, list):
+        return
+    records = table.json_data
+    half = len(records) / 2
+
+    table2 = JsonTable()
+    table2.load_json_data(copy.deepcopy(records[:half]))
+    table2.append_json(copy.deepcopy(records[half:]))
+    assert table2.csv_data == table.csv_data
+    assert table2.json_data == table.json_data
+
+    rest = JsonTable()
+    rest.load_json_data(copy.deepcopy(records[half:]))
+    table3 = JsonTable()
+    table3.load_csv_data(copy.deepcopy(table2.csv_data[:len(table2.csv_data) - len(rest.csv_data) + 1]))
+    table3.append_rows(rest.csv_data[1:], header=rest.csv_data[0])
+    assert table3.json_data == table.json_data
+    table4 = JsonTable()
+    table4.load_csv_data(table3.csv_data)
+    assert table4.json_data == table.json_data
+
+
+def test_convert_many(tmpdir):
+    filenames = []
+    for filename in examples:
+        shutil.copy(filename, str(tmpdir))
+        filenames.append(str(tmpdir.join(os.path.basename(filename))))
+
+    results = convert_many(filenames, concurrency=4)
+    assert [result[0] for result in results] == filenames
+    for filename, rows, error in results:
+        assert error is None
+        assert os.path.exists(os.path.splitext(filename)[0] + switch[os.path.splitext(filename)[1]])
+
+
 if __name__ == '__main__':
     sys.exit(pytest.main(['json_table_test.py'] + sys.argv[3:]))
     # test_convert_example_file(examples[0])
@@ -1,14 +1,92 @@
 """
     This module is to handle excel and csv file manipulations.
     The builtin CSV module has problems with floats vs. int and with bools
+
+    Files ending in .gz, .bz2, .xz or .lzma are compressed and decompressed as they are streamed,
+    and compressed files being read are also recognized by their magic bytes.
 """
+import bz2
+import gzip
+import io
+import os
+
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+
+BUFFER_SIZE = 1 << 16
+COMPRESS_LEVEL = 6
+COMPRESSION_EXTENSIONS = {'.gz': 'gzip', '.bz2': 'bz2', '.xz': 'lzma', '.lzma': 'lzma'}
+COMPRESSION_MAGIC = [('\x1f\x8b', 'gzip'), ('BZh', 'bz2'), ('\xfd7zXZ\x00', 'lzma'), ('\x5d\x00\x00', 'lzma')]
+
+
+def split_compression_ext(filename):
+    """
+    :param filename: str of the file name i.e. data.json.gz
+    :return: tuple of (str of the file name without the compression extension, str of the compression extension)
+    """
+    name, ext = os.path.splitext(filename)
+    if ext in COMPRESSION_EXTENSIONS:
+        return name, ext
+    return filename, ''
+
+
+def get_compression(filename, mode='r'):
+    """
+    This will return the compression of the file by its magic bytes when reading or by its extension
+    :param filename: str of the file name
+    :param mode: str of the mode the file will be opened in
+    :return: str of 'gzip', 'bz2', 'lzma' or None
+    """
+    if 'r' in mode and os.path.exists(filename):
+        with open(filename, 'rb') as fn:
+            magic = fn.read(6)
+        for prefix, compression in COMPRESSION_MAGIC:
+            if magic.startswith(prefix):
+                return compression
+        return None
+    return COMPRESSION_EXTENSIONS.get(split_compression_ext(filename)[1])
+
+
+def open_file(filename, mode='r', compresslevel=None, buffer_size=None):
+    """
+    This will open a file, compressing or decompressing it as a stream when it is compressed
+    :param filename: str of the file name
+    :param mode: str of 'r' or 'w'
+    :param compresslevel: int of the compression level (1-9), defaults to COMPRESS_LEVEL
+    :param buffer_size: int of the size of the read / write buffer, defaults to BUFFER_SIZE
+    :return: file like object
+    """
+    compresslevel = compresslevel or COMPRESS_LEVEL
+    buffer_size = buffer_size or BUFFER_SIZE
+    compression = get_compression(filename, mode)
+    mode = mode.replace('b', '')
+    if compression is None:
+        return open(filename, mode, buffer_size)
+    if compression == 'gzip':
+        fn = gzip.GzipFile(filename, mode + 'b', compresslevel)
+    elif compression == 'bz2':
+        return bz2.BZ2File(filename, mode, buffer_size, compresslevel)
+    elif lzma is None:
+        raise ImportError('lzma (backports.lzma on python 2) is needed to open %s' % filename)
+    else:
+        fn = lzma.LZMAFile(filename, mode + 'b', preset=compresslevel if 'w' in mode else None)
+    if 'r' in mode:
+        return io.BufferedReader(fn, buffer_size)
+    return io.BufferedWriter(fn, buffer_size)
+
 
-def read_csv(filename,deliminator=',',transpose=False):
+def read_csv(filename,deliminator=',',transpose=False,buffer_size=None):
     """ This will read in a csv file, as excel would write it.
     :param filename: this
+    :param buffer_size: int of the size of the read buffer
     :return: list of list of the data
     """
-    with open(filename,'r') as fn:
+    with open_file(filename,'r',buffer_size=buffer_size) as fn:
         text = fn.read()
 
     ret = []
@@ -33,11 +111,13 @@ def read_csv(filename,deliminator=',',transpose=False):
         return trans_ret
     return ret
 
-def write_csv(filename,data,deliminator=',',space_column=None, transpose=False):
+def write_csv(filename,data,deliminator=',',space_column=None, transpose=False, compresslevel=None, buffer_size=None):
     """ This will write a list of list to a csv file
     :param filename: str of the file name
     :param data: list of list of objects
     :param deliminator:
+    :param compresslevel: int of the compression level, if filename has a compression extension
+    :param buffer_size: int of the size of the write buffer
     :return: None
     """
     space_column = space_column or not transpose
@@ -57,7 +137,7 @@ def write_csv(filename,data,deliminator=',',space_column=None, transpose=False):
     else:
         str_data = [deliminator.join(row) for row in str_data]
 
-    with open(filename,'w') as fn:
+    with open_file(filename,'w',compresslevel=compresslevel,buffer_size=buffer_size) as fn:
         fn.write('\n'.join(str_data))
 
 def xls_safe_str(cell):
@@ -0,0 +1,287 @@
+"""
+    This module holds the csv_data of a JsonTable in a sqlite3 table, so a flattened table that
+    doesn't fit in memory can spill to disk.
+
+    The table has a column named after each header path and a row for each row of csv_data, in rowid order.
+    Values are stored as their repr (None as NULL) and read back with eval, like simple_xls does for csv
+    cells, so True, 1 and '1' stay different.
+
+    A SqliteStore can be indexed like the list of list it replaces (store[0] is the header), but
+    queries should go through get_value_set, get_filtered_data, get_column and merge which run as sql.
+
+    Limitations:
+        sqlite column names are case insensitive, so header paths that differ only by case can't be stored
+"""
+
+import sqlite3
+
+
+class SqliteStore(object):
+    def __init__(self, filename=':memory:', table='csv_data', batch_size=1000):
+        """
+        :param filename: str of the sqlite database file, ':memory:' will keep it in memory
+        :param table: str of the name of the sql table
+        :param batch_size: int of the number of rows to insert per transaction and to read per page
+        :return:
+        """
+        self.filename = filename
+        self.table = table
+        self.batch_size = batch_size
+        self.connection = sqlite3.connect(filename, check_same_thread=False)
+        self.header = []
+        self._count = 0
+        self._indexes = set()
+        self._pending = []
+        self._page_start = None
+        self._page = []
+
+    def load(self, csv_data):
+        """
+        This will replace the table with csv_data
+        :param csv_data: list of list with the header as the first row
+        :return: None
+        """
+        self.create(csv_data[0])
+        self.insert_rows(csv_data[1:])
+        self.flush()
+
+    def create(self, header):
+        """
+        This will replace the table with an empty table with the columns of header
+        :param header: list of str of the column paths
+        :return: None
+        """
+        self._pending = []
+        self._reset_page()
+        self.header = list(header)
+        self._count = 0
+        self._indexes = set()
+        with self.connection:
+            self.connection.execute('DROP TABLE IF EXISTS %s' % quote(self.table))
+            self.connection.execute('CREATE TABLE %s (%s)' % (quote(self.table),
+                                                              ', '.join([quote(col) for col in self.header])))
+
+    def add_columns(self, columns):
+        """
+        This will add columns to the end of the header, existing rows will have None for them
+        :param columns: list of str of the new column paths
+        :return: None
+        """
+        self.flush()
+        self._reset_page()
+        with self.connection:
+            for col in columns:
+                self.connection.execute('ALTER TABLE %s ADD COLUMN %s' % (quote(self.table), quote(col)))
+                self.header.append(col)
+
+    def insert_rows(self, rows):
+        """
+        This will add rows to the end of the table, they are inserted batch_size rows per transaction
+        :param rows: list of list of values in the order of the header, short rows are padded with None
+        :return: None
+        """
+        size = len(self.header)
+        for row in rows:
+            self._pending.append([encode(value) for value in row] + [None] * (size - len(row)))
+            if len(self._pending) >= self.batch_size:
+                self.flush()
+
+    def flush(self):
+        """
+        This will insert the pending rows in one transaction
+        :return: None
+        """
+        if not self._pending:
+            return
+        with self.connection:
+            self.connection.executemany('INSERT INTO %s VALUES (%s)' % (quote(self.table),
+                                                                          ', '.join(['?'] * len(self.header))),
+                                        self._pending)
+        self._count += len(self._pending)
+        self._pending = []
+
+    def create_index(self, columns):
+        """
+        This will create an index on the columns, if it hasn't been created yet
+        :param columns: list of str of the column paths
+        :return: None
+        """
+        columns = tuple(columns)
+        if not columns or columns in self._indexes:
+            return
+        self.flush()
+        with self.connection:
+            self.connection.execute('CREATE INDEX IF NOT EXISTS %s ON %s (%s)' % (
+                quote('%s_index_%s' % (self.table, len(self._indexes))), quote(self.table),
+                ', '.join([quote(col) for col in columns])))
+        self._indexes.add(columns)
+
+    def get_column(self, column):
+        """
+        :param column: str of the column path
+        :return: list of the values of the column
+        """
+        self.flush()
+        cursor = self.connection.execute('SELECT %s FROM %s ORDER BY rowid' % (quote(column), quote(self.table)))
+        return [decode(row[0]) for row in cursor]
+
+    def get_filtered_data(self, data_filter=None):
+        """
+        :param data_filter: dict of column path to the value the rows have to have
+        :return: list of list of the rows that match the data_filter
+        """
+        where, values = self._where(data_filter)
+        cursor = self.connection.execute('SELECT * FROM %s%s ORDER BY rowid' % (quote(self.table), where), values)
+        return [[decode(value) for value in row] for row in cursor]
+
+    def get_value_set(self, columns, data_filter=None, only_unique=True):
+        """
+        :param columns: list of str of the column paths to return
+        :param data_filter: dict of column path to the value the rows have to have
+        :param only_unique: bool if True will only return the first of each distinct set of values
+        :return: list of list of the values of the columns
+        """
+        where, values = self._where(data_filter)
+        select = ', '.join([quote(col) for col in columns])
+        if only_unique:
+            sql = 'SELECT %s FROM %s%s GROUP BY %s ORDER BY MIN(rowid)' % (select, quote(self.table), where, select)
+        else:
+            sql = 'SELECT %s FROM %s%s ORDER BY rowid' % (select, quote(self.table), where)
+        return [[decode(value) for value in row] for row in self.connection.execute(sql, values)]
+
+    def merge(self, id_columns, groups, transfer, defaults=None):
+        """
+        This will merge new rows into the table in one transaction.
+        For each key in groups, the rows whose id_columns match it are updated if there is one new row;
+        if there are more, the matching rows are updated with the first one and copies are added to the end
+        for the rest; and if no rows match, the new rows are added to the end.
+        :param id_columns: list of str of the column paths that identify the rows
+        :param groups: OrderedDict of tuple of id values to a list of the new rows with those ids
+        :param transfer: list of tuple of (int of the index in the new row, str of the column path to set)
+        :param defaults: dict of column path to the value for the rows that are added for unmatched keys
+        :return: None
+        """
+        self.flush()
+        self._reset_page()
+        self.create_index(id_columns)
+        table = quote(self.table)
+        sets = ', '.join(['%s = ?' % quote(col) for _, col in transfer])
+        with self.connection:
+            for key, new_rows in groups.items():
+                where, values = self._match(dict(zip(id_columns, key)))
+                old_rows = self.connection.execute('SELECT rowid, * FROM %s%s ORDER BY rowid' % (table, where),
+                                                   values).fetchall()
+                key = [encode(value) for value in key]
+                if not old_rows:
+                    for new_row in new_rows:
+                        row = [encode((defaults or {}).get(col)) for col in self.header]
+                        for col, value in zip(id_columns, key):
+                            row[self.header.index(col)] = value
+                        for new_i, col in transfer:
+                            row[self.header.index(col)] = encode(new_row[new_i])
+                        self._pending.append(row)
+                    continue
+
+                self.connection.execute('UPDATE %s SET %s%s' % (table, sets, where),
+                                        [encode(new_rows[0][new_i]) for new_i, _ in transfer] + values)
+                for old_row in old_rows:
+                    for new_row in new_rows[1:]:
+                        row = list(old_row[1:])
+                        for new_i, col in transfer:
+                            row[self.header.index(col)] = encode(new_row[new_i])
+                        self._pending.append(row)
+            if self._pending:
+                self.connection.executemany('INSERT INTO %s VALUES (%s)' % (table, ', '.join(['?'] * len(self.header))),
+                                            self._pending)
+                self._count += len(self._pending)
+                self._pending = []
+
+    def _where(self, data_filter):
+        self.flush()
+        if data_filter:
+            self.create_index(list(data_filter))
+        return self._match(data_filter)
+
+    @staticmethod
+    def _match(data_filter):
+        """
+        :param data_filter: dict of column path to value
+        :return: tuple of (str of the sql where clause, list of the values for it)
+        """
+        if not data_filter:
+            return '', []
+        where = []
+        values = []
+        for col, value in data_filter.items():
+            if value is None:
+                where.append('%s IS NULL' % quote(col))
+            else:
+                where.append('%s = ?' % quote(col))
+                values.append(encode(value))
+        return ' WHERE ' + ' AND '.join(where), values
+
+    def _reset_page(self):
+        self._page_start = None
+        self._page = []
+
+    def _get_row(self, index):
+        if self._page_start is None or not self._page_start <= index < self._page_start + len(self._page):
+            self.flush()
+            self._page_start = index
+            cursor = self.connection.execute('SELECT * FROM %s WHERE rowid >= ? AND rowid < ? ORDER BY rowid' % (
+                quote(self.table)), (index, index + self.batch_size))
+            self._page = [[decode(value) for value in row] for row in cursor]
+        return self._page[index - self._page_start]
+
+    def __len__(self):
+        return self.header and self._count + len(self._pending) + 1 or 0
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('row %s is not in the table' % index)
+        if index == 0:
+            return self.header
+        return self._get_row(index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def __nonzero__(self):
+        return bool(self.header)
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+
+def quote(name):
+    """
+    :param name: str of the table or column name
+    :return: str of the name quoted as a sql identifier
+    """
+    return '"%s"' % name.replace('"', '""')
+
+
+def encode(value):
+    """
+    :param value: obj of a csv_data cell
+    :return: str of the repr of value or None
+    """
+    if value is None:
+        return None
+    return repr(value)
+
+
+def decode(value):
+    """
+    :param value: str of an encoded cell
+    :return: obj of the csv_data cell
+    """
+    if value is None:
+        return None
+    return eval(value, {}, {})